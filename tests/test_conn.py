@@ -8,6 +8,7 @@ import pytest
 from virtinst import cli
 from virtinst import pollhelpers
 from virtinst import StoragePool
+from virtinst import StorageVolume
 from virtinst import URI
 
 
@@ -35,7 +36,7 @@ def test_misc():
 
     # Hit a special code path that reflects default libvirt transport
     # pylint: disable=protected-access
-    conn._uriobj = URI("qemu://example.com/system")
+    conn._set_uriobj(URI("qemu://example.com/system"))
     assert conn.get_uri_transport() == "tls"
 
     # Hit the qemu:///embed case privileged case check
@@ -89,6 +90,33 @@ def test_poll():
     conn.fetch_all_pools()
     poolobj2 = makepool("conntest2", True)
     conn.fetch_all_vols()
+    # Inactive pool added after the volume cache is primed
+    poolobj3 = makepool("conntest3", False)
     poolobj1.undefine()
     poolobj2.destroy()
     poolobj2.undefine()
+    poolobj3.undefine()
+
+    # Volume cache primed without the pool cache, new pool volumes
+    # must still be picked up
+    conn = cli.getConnection("test:///default")
+    conn.fetch_all_vols()
+    poolobj4 = makepool("conntest4", True)
+    vol = StorageVolume(conn)
+    vol.pool = poolobj4
+    vol.name = "conntest4-vol"
+    vol.capacity = 1024 * 1024
+    volobj = vol.install()
+    conn.cache_new_pool(poolobj4)
+    assert "conntest4-vol" in [v.name for v in conn.fetch_all_vols()]
+
+    # Opt-in parallel volume fetch gives the same result
+    conn2 = cli.getConnection("test:///default")
+    conn2.fetch_vols_max_workers = 4
+    assert (sorted(v.name for v in conn2.fetch_all_vols()) ==
+            sorted(v.name for v in conn.fetch_all_vols()))
+    conn2.close()
+    volobj.delete(0)
+    poolobj4.destroy()
+    poolobj4.undefine()
+
@@ -147,12 +147,13 @@ class _URIs(object):
             conn.fetch_all_nodedevs()
 
             self._conn_cache[uri] = {}
-            for key, value in conn._fetch_cache.items():
-                self._conn_cache[uri][key] = value[:]
+            for key in ["_cache_vms", "_cache_pools",
+                        "_cache_vols", "_cache_nodedevs"]:
+                self._conn_cache[uri][key] = getattr(conn, key)
 
         # Prime the internal connection cache
         for key, value in self._conn_cache[uri].items():
-            conn._fetch_cache[key] = value[:]
+            setattr(conn, key, value)
 
         def cb_cache_new_pool(poolobj):
             # Used by clonetest.py nvram-newpool test
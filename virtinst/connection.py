@@ -4,6 +4,8 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import concurrent.futures
+import itertools
 import os
 import weakref
 
@@ -73,10 +75,18 @@ class VirtinstConnection(object):
         self._conn_version = None
 
         self._libvirtconn = None
-        self._uriobj = URI(self._uri)
+        self._uriobj = None
+        self._set_uriobj(URI(self._uri))
+        openuriobj = self._uriobj
+        if self._open_uri != self._uri:
+            openuriobj = URI(self._open_uri)
+        self._is_really_test = openuriobj.scheme.startswith("test")
         self._caps = None
 
-        self._fetch_cache = {}
+        self._cache_vms = None
+        self._cache_pools = None
+        self._cache_vols = None
+        self._cache_nodedevs = None
 
         # These let virt-manager register a callback which provides its
         # own cached object lists, rather than doing fresh calls
@@ -86,18 +96,52 @@ class VirtinstConnection(object):
         self.cb_fetch_all_nodedevs = None
         self.cb_cache_new_pool = None
 
-        self.support = support.SupportCache(weakref.proxy(self))
+        # Max number of threads fetch_all_vols uses to overlap the per
+        # pool libvirt calls. Defaults to serial; callers that know
+        # their connection is safe to share across threads can raise it
+        self.fetch_vols_max_workers = 1
+
+        # Shared weak reference handed to every object we build, so they
+        # don't keep the connection alive
+        self._weakself = weakref.proxy(self)
+        self.support = support.SupportCache(self._weakself)
 
 
     ##############
     # Properties #
     ##############
 
+    # virConnect APIs that are called often enough from polling and
+    # lookup paths that we bind them directly on open(), so access
+    # doesn't have to go through __getattr__
+    _BOUND_LIBVIRT_APIS = [
+        "getCapabilities",
+        "getDomainCapabilities",
+        "listAllDevices",
+        "listAllDomains",
+        "listAllNetworks",
+        "listAllStoragePools",
+        "lookupByName",
+        "networkLookupByName",
+        "nodeDeviceLookupByName",
+        "storagePoolLookupByName",
+        "storageVolLookupByPath",
+    ]
+
     def __getattr__(self, attr):
         # Proxy virConnect API calls
         libvirtconn = self.__dict__.get("_libvirtconn")
         return getattr(libvirtconn, attr)
 
+    def _bind_libvirt_apis(self, conn):
+        for name in self._BOUND_LIBVIRT_APIS:
+            self.__dict__.pop(name, None)
+            # Older bindings may lack some of these, in which case we
+            # leave it to __getattr__ and the support checks
+            func = conn and getattr(conn, name, None)
+            if func:
+                self.__dict__[name] = func
+
     def _get_uri(self):
         return self._uri or self._open_uri
     uri = property(_get_uri)
@@ -118,6 +162,35 @@ class VirtinstConnection(object):
     # Private helpers #
     ###################
 
+    def _set_uriobj(self, uriobj):
+        """
+        Set the URI object and precompute the URI checks, since the
+        URI can't change while the connection is open
+        """
+        self._uriobj = uriobj
+        self._is_remote = bool(uriobj.hostname)
+
+        self._uri_transport = uriobj.transport
+        if uriobj.hostname and not uriobj.transport:
+            # Libvirt defaults to transport=tls if hostname specified but
+            # no transport is specified
+            self._uri_transport = "tls"
+
+        self._is_privileged = True
+        if uriobj.path == "/session":
+            self._is_privileged = False
+        elif uriobj.path == "/embed":
+            self._is_privileged = os.getuid() == 0
+
+        scheme = uriobj.scheme or ""
+        self._is_qemu = scheme.startswith("qemu")
+        self._is_test = scheme.startswith("test")
+        self._is_xen = scheme.startswith(("xen", "libxl"))
+        self._is_lxc = scheme.startswith("lxc")
+        self._is_openvz = scheme.startswith("openvz")
+        self._is_vz = scheme.startswith(("vz", "parallels"))
+        self._is_bhyve = scheme.startswith("bhyve")
+
     def _log_versions(self):
         def format_version(num):
             major = int(num / 1000000)
@@ -140,8 +213,12 @@ class VirtinstConnection(object):
         if self._libvirtconn:
             ret = self._libvirtconn.close()
         self._libvirtconn = None
+        self._bind_libvirt_apis(None)
         self._uri = None
-        self._fetch_cache = {}
+        self._cache_vms = None
+        self._cache_pools = None
+        self._cache_vols = None
+        self._cache_nodedevs = None
         return ret
 
     def fake_conn_predictable(self):
@@ -176,9 +253,10 @@ class VirtinstConnection(object):
             self._magic_uri.overwrite_conn_functions(conn)
 
         self._libvirtconn = conn
+        self._bind_libvirt_apis(conn)
         if not self._open_uri:
             self._uri = self._libvirtconn.getURI()
-            self._uriobj = URI(self._uri)
+            self._set_uriobj(URI(self._uri))
 
         self._log_versions()
         self._get_caps()  # cache and log capabilities
@@ -194,17 +272,19 @@ class VirtinstConnection(object):
     # Polling routines #
     ####################
 
-    _FETCH_KEY_DOMAINS = "vms"
-    _FETCH_KEY_POOLS = "pools"
-    _FETCH_KEY_VOLS = "vols"
-    _FETCH_KEY_NODEDEVS = "nodedevs"
-
-    def _fetch_helper(self, key, raw_cb, override_cb):
+    def _fetch_helper(self, cachename, raw_cb, override_cb):
+        """
+        Return the cached tuple stored in attribute @cachename, filling
+        it with raw_cb() on a miss. Tuples can be handed out directly
+        without a defensive copy
+        """
         if override_cb:
             return override_cb()  # pragma: no cover
-        if key not in self._fetch_cache:
-            self._fetch_cache[key] = raw_cb()
-        return self._fetch_cache[key][:]
+        ret = getattr(self, cachename)
+        if ret is None:
+            ret = tuple(raw_cb())
+            setattr(self, cachename, ret)
+        return ret
 
     def _fetch_all_domains_raw(self):
         dummy1, dummy2, ret = pollhelpers.fetch_vms(
@@ -217,12 +297,11 @@ class VirtinstConnection(object):
             except libvirt.libvirtError as e:  # pragma: no cover
                 log.debug("Fetching domain XML failed: %s", e)
                 continue
-            domains.append(Guest(weakref.proxy(self), parsexml=xml))
+            domains.append(Guest(self._weakself, parsexml=xml))
         return domains
 
     def _build_pool_raw(self, poolobj):
-        return StoragePool(weakref.proxy(self),
-                           parsexml=poolobj.XMLDesc(0))
+        return StoragePool(self._weakself, parsexml=poolobj.XMLDesc(0))
 
     def _fetch_all_pools_raw(self):
         dummy1, dummy2, ret = pollhelpers.fetch_pools(
@@ -241,52 +320,69 @@ class VirtinstConnection(object):
     def _fetch_all_nodedevs_raw(self):
         dummy1, dummy2, ret = pollhelpers.fetch_nodedevs(
             self, {}, lambda obj, ignore: obj)
-        return [NodeDevice(weakref.proxy(self), obj.XMLDesc(0))
+        return [NodeDevice(self._weakself, obj.XMLDesc(0))
                 for obj in ret]
 
-    def _fetch_vols_raw(self, poolxmlobj):
+    def _fetch_vol_xmls_raw(self, pool):
+        """
+        Return the volume XML strings for the passed virStoragePool. This
+        only makes libvirt calls, so it is safe to run from worker threads.
+        """
         ret = []
-        # TOCTOU race: a volume may go away in between enumeration and inspection
-        try:
-            pool = self._libvirtconn.storagePoolLookupByName(poolxmlobj.name)
-        except libvirt.libvirtError:  # pragma: no cover
-            return ret
-
-        if pool.info()[0] != libvirt.VIR_STORAGE_POOL_RUNNING:
-            return ret
-
         dummy1, dummy2, vols = pollhelpers.fetch_volumes(
             self, pool, {}, lambda obj, ignore: obj)
 
         for vol in vols:
+            # TOCTOU race: a volume may go away in between enumeration and inspection
             try:
-                xml = vol.XMLDesc(0)
-                ret.append(StorageVolume(weakref.proxy(self), parsexml=xml))
+                ret.append(vol.XMLDesc(0))
             except libvirt.libvirtError as e:  # pragma: no cover
                 log.debug("Fetching volume XML failed: %s", e)
         return ret
 
+    def _fetch_vols_raw(self, poolxmlobj):
+        # TOCTOU race: a pool may go away in between enumeration and inspection
+        try:
+            pool = self._libvirtconn.storagePoolLookupByName(poolxmlobj.name)
+        except libvirt.libvirtError:  # pragma: no cover
+            return []
+
+        if pool.info()[0] != libvirt.VIR_STORAGE_POOL_RUNNING:
+            return []
+
+        return [StorageVolume(self._weakself, parsexml=xml)
+                for xml in self._fetch_vol_xmls_raw(pool)]
+
     def _fetch_all_vols_raw(self):
-        ret = []
-        for poolxmlobj in self.fetch_all_pools():
-            ret.extend(self._fetch_vols_raw(poolxmlobj))
-        return ret
+        # Filtering on active pools saves a lookup and info() round
+        # trip per pool
+        dummy1, dummy2, pools = pollhelpers.fetch_pools(
+            self, {}, lambda obj, ignore: obj,
+            flags=libvirt.VIR_CONNECT_LIST_STORAGE_POOLS_ACTIVE)
+        workers = min(len(pools), self.fetch_vols_max_workers)
+        if workers <= 1:
+            results = [self._fetch_vol_xmls_raw(pool) for pool in pools]
+        else:
+            # Overlap the per pool RPC latency. XML parsing stays in
+            # this thread
+            with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                results = list(executor.map(self._fetch_vol_xmls_raw, pools))
+
+        return [StorageVolume(self._weakself, parsexml=xml)
+                for xml in itertools.chain.from_iterable(results)]
 
     def _cache_new_pool_raw(self, poolobj):
-        # Make sure cache is primed
-        if self._FETCH_KEY_POOLS not in self._fetch_cache:
-            # Nothing cached yet, so next poll will pull in latest bits,
-            # so there's nothing to do
+        # The pool and volume caches are filled independently. If
+        # one isn't primed yet, its next poll will pull in the latest
+        # bits, so there's nothing to do for it
+        if self._cache_pools is None and self._cache_vols is None:
             return
 
-        poollist = self._fetch_cache[self._FETCH_KEY_POOLS]
         poolxmlobj = self._build_pool_raw(poolobj)
-        poollist.append(poolxmlobj)
-
-        if self._FETCH_KEY_VOLS not in self._fetch_cache:
-            return
-        vollist = self._fetch_cache[self._FETCH_KEY_VOLS]
-        vollist.extend(self._fetch_vols_raw(poolxmlobj))
+        if self._cache_pools is not None:
+            self._cache_pools += (poolxmlobj,)
+        if self._cache_vols is not None:
+            self._cache_vols += tuple(self._fetch_vols_raw(poolxmlobj))
 
     def cache_new_pool(self, poolobj):
         """
@@ -299,37 +395,37 @@ class VirtinstConnection(object):
 
     def fetch_all_domains(self):
         """
-        Returns a list of Guest() objects
+        Returns a sequence of Guest() objects
         """
         return self._fetch_helper(
-                self._FETCH_KEY_DOMAINS,
+                "_cache_vms",
                 self._fetch_all_domains_raw,
                 self.cb_fetch_all_domains)
 
     def fetch_all_pools(self):
         """
-        Returns a list of StoragePool objects
+        Returns a sequence of StoragePool objects
         """
         return self._fetch_helper(
-                self._FETCH_KEY_POOLS,
+                "_cache_pools",
                 self._fetch_all_pools_raw,
                 self.cb_fetch_all_pools)
 
     def fetch_all_vols(self):
         """
-        Returns a list of StorageVolume objects
+        Returns a sequence of StorageVolume objects
         """
         return self._fetch_helper(
-                self._FETCH_KEY_VOLS,
+                "_cache_vols",
                 self._fetch_all_vols_raw,
                 self.cb_fetch_all_vols)
 
     def fetch_all_nodedevs(self):
         """
-        Returns a list of NodeDevice() objects
+        Returns a sequence of NodeDevice() objects
         """
         return self._fetch_helper(
-                self._FETCH_KEY_NODEDEVS,
+                "_cache_nodedevs",
                 self._fetch_all_nodedevs_raw,
                 self.cb_fetch_all_nodedevs)
 
@@ -384,15 +480,11 @@ class VirtinstConnection(object):
     ###################
 
     def is_remote(self):
-        return bool(self._uriobj.hostname)
+        return self._is_remote
     def is_privileged(self):
-        if self.get_uri_path() == "/session":
-            return False
-        if self.get_uri_path() == "/embed":
-            return os.getuid() == 0
-        return True
+        return self._is_privileged
     def is_unprivileged(self):
-        return not self.is_privileged()
+        return not self._is_privileged
 
     def get_uri_hostname(self):
         return self._uriobj.hostname
@@ -401,11 +493,7 @@ class VirtinstConnection(object):
     def get_uri_username(self):
         return self._uriobj.username
     def get_uri_transport(self):
-        if self.get_uri_hostname() and not self._uriobj.transport:
-            # Libvirt defaults to transport=tls if hostname specified but
-            # no transport is specified
-            return "tls"
-        return self._uriobj.transport
+        return self._uri_transport
     def get_uri_path(self):
         return self._uriobj.path
 
@@ -413,30 +501,28 @@ class VirtinstConnection(object):
         return self._uriobj.scheme
 
     def is_qemu(self):
-        return self._uriobj.scheme.startswith("qemu")
+        return self._is_qemu
     def is_qemu_privileged(self):
         return (self.is_qemu() and self.is_privileged())
     def is_qemu_unprivileged(self):
         return (self.is_qemu() and self.is_unprivileged())
 
     def is_really_test(self):
-        return URI(self._open_uri).scheme.startswith("test")
+        return self._is_really_test
     def is_test(self):
-        return self._uriobj.scheme.startswith("test")
+        return self._is_test
     def is_xen(self):
-        return (self._uriobj.scheme.startswith("xen") or
-                self._uriobj.scheme.startswith("libxl"))
+        return self._is_xen
     def is_lxc(self):
-        return self._uriobj.scheme.startswith("lxc")
+        return self._is_lxc
     def is_openvz(self):
-        return self._uriobj.scheme.startswith("openvz")
+        return self._is_openvz
     def is_container_only(self):
         return self.is_lxc() or self.is_openvz()
     def is_vz(self):
-        return (self._uriobj.scheme.startswith("vz") or
-                self._uriobj.scheme.startswith("parallels"))
+        return self._is_vz
     def is_bhyve(self):
-        return self._uriobj.scheme.startswith("bhyve")
+        return self._is_bhyve
 
 
     #########################
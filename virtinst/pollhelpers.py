@@ -44,9 +44,10 @@ def fetch_nets(backend, origmap, build_cb):
     return _new_poll_helper(origmap, typename, list_cb, build_cb, support_cb)
 
 
-def fetch_pools(backend, origmap, build_cb):
+def fetch_pools(backend, origmap, build_cb, flags=0):
     typename = "pool"
-    list_cb = backend.listAllStoragePools
+    def list_cb():
+        return backend.listAllStoragePools(flags)
     support_cb = backend.support.conn_storage
     return _new_poll_helper(origmap, typename, list_cb, build_cb, support_cb)
 
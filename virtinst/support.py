@@ -181,10 +181,16 @@ def _make(*args, **kwargs):
     support_obj = _SupportCheck(*args, **kwargs)
 
     def cache_wrapper(self, data=None):
-        if support_obj not in self._cache:
-            support_ret = support_obj(self._virtconn, data or self._virtconn)
+        # support_obj() always returns a bool, so None means uncached
+        support_ret = self._cache.get(support_obj)
+        if support_ret is None:
+            if data is None:
+                # Pass the raw virConnect, so support_obj doesn't need
+                # to sniff repr() to unwrap the VirtinstConnection
+                data = self._virtconn.get_conn_for_api_arg()
+            support_ret = support_obj(self._virtconn, data)
             self._cache[support_obj] = support_ret
-        return self._cache[support_obj]
+        return support_ret
 
     return cache_wrapper
 
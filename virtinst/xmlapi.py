@@ -4,6 +4,8 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import functools
+
 import libxml2
 
 from . import xmlutil
@@ -82,6 +84,16 @@ class _XPath(object):
         return self.join(self.segments[:-1])
 
 
+@functools.lru_cache(maxsize=4096)
+def _get_xpath(fullxpath):
+    """
+    Return a shared _XPath for the passed string. Every parsed object
+    looks up the same small set of xpaths, so only split them once.
+    Callers must treat the returned object as read only.
+    """
+    return _XPath(fullxpath)
+
+
 class _XMLBase(object):
     NAMESPACES = {}
     @classmethod
@@ -135,7 +147,7 @@ class _XMLBase(object):
             return None
         if is_bool:
             return True
-        xpathobj = _XPath(xpath)
+        xpathobj = _get_xpath(xpath)
         if xpathobj.is_prop:
             return self._node_get_property(node, xpathobj.propname)
         return self._node_get_text(node)
@@ -176,7 +188,7 @@ class _XMLBase(object):
         of whether it has children or not, and then clean up the XML
         chain
         """
-        xpathobj = _XPath(fullxpath)
+        xpathobj = _get_xpath(fullxpath)
         parentnode = self._find(xpathobj.parent_xpath())
         childnode = self._find(fullxpath)
         if parentnode is None or childnode is None:
@@ -193,7 +205,7 @@ class _XMLBase(object):
             {"expectname": expected_root_name, "foundname": rootname})
 
     def _node_set_content(self, xpath, node, setval):
-        xpathobj = _XPath(xpath)
+        xpathobj = _get_xpath(xpath)
         if setval is not None:
             setval = str(setval)
         if xpathobj.is_prop:
@@ -223,7 +235,7 @@ class _XMLBase(object):
         Even if <bar> didn't exist before. So we fill in the dependent property
         expression values
         """
-        xpathobj = _XPath(fullxpath)
+        xpathobj = _get_xpath(fullxpath)
         parentxpath = "."
         parentnode = self._find(parentxpath)
         if not parentnode:
@@ -257,7 +269,7 @@ class _XMLBase(object):
         if it doesn't have any children or attributes, so we don't
         leave stale elements in the XML
         """
-        xpathobj = _XPath(fullxpath)
+        xpathobj = _get_xpath(fullxpath)
         segments = xpathobj.segments[:]
         parent = None
         while segments:
@@ -313,7 +325,7 @@ class _Libxml2API(_XMLBase):
         return _Libxml2API(self._doc.children.serialize())
 
     def _find(self, fullxpath):
-        xpath = _XPath(fullxpath).xpath
+        xpath = _get_xpath(fullxpath).xpath
         try:
             node = self._ctx.xpathEval(xpath)
         except Exception as e:
@@ -90,8 +90,11 @@ class _XMLPropertyCache(object):
         self._prop_to_name = {}
 
     def _get_prop_cache(self, cls, checkclass):
-        cachename = str(cls) + "-" + checkclass.__name__
-        if cachename not in self._name_to_prop:
+        # This runs for every XMLBuilder we construct, so key on the
+        # classes themselves rather than formatting a string each time
+        cachename = (cls, checkclass)
+        ret = self._name_to_prop.get(cachename)
+        if ret is None:
             ret = {}
             for c in reversed(type.mro(cls)[:-1]):
                 for key, val in c.__dict__.items():
@@ -99,7 +102,7 @@ class _XMLPropertyCache(object):
                         ret[key] = val
                         self._prop_to_name[val] = key
             self._name_to_prop[cachename] = ret
-        return self._name_to_prop[cachename]
+        return ret
 
     def get_xml_props(self, inst):
         return self._get_prop_cache(inst.__class__, XMLProperty)